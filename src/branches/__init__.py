@@ -0,0 +1,4 @@
+# 对话框依赖 PyQt5，不在这里导入，无界面的守护进程只需要 branch_overview
+from .branch_overview import branch_overview, ensure_commit_graph
+
+__all__ = ['branch_overview', 'ensure_commit_graph']
@@ -0,0 +1,95 @@
+from service.repo_ops import git_output, run_git
+
+REF_FORMAT = "%(refname)%00%(refname:short)%00%(objectname)%00%(committerdate:iso)%00%(authorname)%00" \
+             "%(upstream:short)%00%(upstream:track,nobracket)%00%(symref)"
+
+
+def ensure_commit_graph(repo):
+    """
+    打开 commit-graph 并增量写入（--split 只追加新提交），使计数和领先/落后计算走生成号
+    """
+    if git_output(["config", "--get", "core.commitGraph"], repo) != "true":
+        for key in ("core.commitGraph", "fetch.writeCommitGraph", "gc.writeCommitGraph"):
+            run_git(["config", key, "true"], repo)
+    run_git(["commit-graph", "write", "--reachable", "--split", "--no-progress"], repo)
+
+
+def default_branch(repo, refs):
+    """
+    默认分支：origin/HEAD 指向的分支，否则 main/master，再退回当前分支；
+    HEAD 游离时用第一个分支，保证总有一个基准可以计数
+    """
+    origin_head = git_output(["symbolic-ref", "--quiet", "--short", "refs/remotes/origin/HEAD"], repo)
+    if origin_head in refs:
+        return origin_head
+    for name in ("main", "master", "origin/main", "origin/master"):
+        if name in refs:
+            return name
+    return git_output(["symbolic-ref", "--quiet", "--short", "HEAD"], repo) or refs[0]
+
+
+def parse_track(track):
+    """
+    解析 %(upstream:track,nobracket)，如 "ahead 1, behind 2"
+    """
+    ahead, behind = 0, 0
+    for part in track.split(","):
+        part = part.strip()
+        if part.startswith("ahead "):
+            ahead = int(part[len("ahead "):])
+        elif part.startswith("behind "):
+            behind = int(part[len("behind "):])
+    return ahead, behind
+
+
+def ahead_behind(repo, base, tips):
+    """
+    返回 {tip: (ahead, behind)}；git 2.41+ 一次 for-each-ref 算完，旧版本逐个 rev-list
+    """
+    result = {}
+    output = run_git(["for-each-ref", f"--format=%(objectname) %(ahead-behind:{base})",
+                      "refs/heads", "refs/remotes"], repo)
+    if output.returncode == 0:
+        for line in output.stdout.splitlines():
+            tip, ahead, behind = line.split()
+            result[tip] = (int(ahead), int(behind))
+        return result
+    for tip in set(tips):
+        counts = git_output(["rev-list", "--left-right", "--count", f"{base}...{tip}"], repo).split()
+        if len(counts) == 2:
+            result[tip] = (int(counts[1]), int(counts[0]))
+    return result
+
+
+def branch_overview(repo):
+    """
+    所有本地/远程分支的 tip 时间、作者、提交数、相对上游和默认分支的领先/落后
+    """
+    ensure_commit_graph(repo)
+    branches = []
+    for line in git_output(["for-each-ref", f"--format={REF_FORMAT}", "refs/heads", "refs/remotes"],
+                           repo).splitlines():
+        ref, name, tip, date, author, upstream, track, symref = line.split("\x00")
+        if symref:
+            continue
+        branches.append({
+            "name": name,
+            "remote": ref.startswith("refs/remotes/"),
+            "tip": tip,
+            "date": date,
+            "author": author,
+            "upstream": upstream,
+            "upstream_ahead_behind": parse_track(track) if upstream and track != "gone" else None,
+        })
+    if not branches:
+        return "", []
+
+    base = default_branch(repo, [branch["name"] for branch in branches])
+    counts = ahead_behind(repo, base, [branch["tip"] for branch in branches])
+    # 提交数 = 默认分支提交数 + 领先 - 落后，只需数一次
+    base_count = int(git_output(["rev-list", "--count", base], repo) or 0)
+    for branch in branches:
+        ahead, behind = counts.get(branch["tip"], (0, 0))
+        branch["default_ahead_behind"] = (ahead, behind)
+        branch["commits"] = base_count + ahead - behind
+    return base, branches
@@ -0,0 +1,61 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
+)
+
+from .branch_overview import branch_overview
+
+
+class BranchOverviewDialog(QDialog):
+    HEADERS = ["分支", "最后提交时间", "作者", "提交数", "上游", "上游 领先/落后", "默认分支 领先/落后"]
+
+    def __init__(self, repo, parent=None):
+        super().__init__(parent)
+        self.selected_branch = None
+        self.setWindowTitle("分支概览")
+        self.resize(900, 500)
+
+        layout = QVBoxLayout(self)
+        self.base_label = QLabel()
+        layout.addWidget(self.base_label)
+
+        self.table = QTableWidget(0, len(self.HEADERS))
+        self.table.setHorizontalHeaderLabels(self.HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.table.cellDoubleClicked.connect(self.select_branch)
+        layout.addWidget(self.table)
+
+        self.load_overview(repo)
+
+    @staticmethod
+    def format_ahead_behind(counts):
+        if counts is None:
+            return ""
+        return f"+{counts[0]} / -{counts[1]}"
+
+    def load_overview(self, repo):
+        base, branches = branch_overview(repo)
+        self.base_label.setText(f"默认分支: {base}（双击切换到该分支）")
+        self.table.setRowCount(len(branches))
+        for row, branch in enumerate(branches):
+            values = [
+                branch["name"],
+                branch["date"],
+                branch["author"],
+                str(branch["commits"]),
+                branch["upstream"],
+                self.format_ahead_behind(branch["upstream_ahead_behind"]),
+                self.format_ahead_behind(branch["default_ahead_behind"]),
+            ]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def select_branch(self, row, column):
+        name = self.table.item(row, 0).text()
+        # 主窗口的分支列表中远程分支不带 origin/ 前缀
+        self.selected_branch = name[len("origin/"):] if name.startswith("origin/") else name
+        self.accept()
+
+    def get_selected_branch(self):
+        return self.selected_branch
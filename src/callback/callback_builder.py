@@ -30,6 +30,35 @@ if commit_id in commit_changes:
     commit.author_date = f"{{timestamp}} +0800".encode("utf-8")
     commit.committer_date = f"{{timestamp}} +0800".encode("utf-8")
     commit.message = change["message"].encode("utf-8")
+'''
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            with open(filepath, "w", encoding="utf-8", newline="\n") as f:
+                f.write(content.lstrip())
+            return True
+        except Exception as e:
+            print(f"[CallbackScriptBuilder] 错误: {e}")
+            return False
+
+    @staticmethod
+    def build_rules_callback(filepath: str, rules_spec: dict) -> bool:
+        """
+        生成 callback 脚本，对所有提交应用规则（身份映射、提交信息正则、时间平移）
+        规则只在第一次回调时编译，之后缓存在 filter-repo 的全局命名空间中复用
+        """
+        try:
+            import json
+            from rules.rule_engine import runtime_source
+
+            content = f'''
+_gce_rules = globals().get("_gce_rules")
+if _gce_rules is None:
+    import json
+    _gce_namespace = {{}}
+    exec({runtime_source()!r}, _gce_namespace)
+    _gce_rules = (_gce_namespace["compile_rules"](json.loads({json.dumps(rules_spec, ensure_ascii=False)!r})),
+                  _gce_namespace["apply_rules"])
+    globals()["_gce_rules"] = _gce_rules
+_gce_rules[1](_gce_rules[0], commit)
 '''
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
             with open(filepath, "w", encoding="utf-8", newline="\n") as f:
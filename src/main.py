@@ -1,22 +1,27 @@
-import datetime
 import json
 import logging
+import multiprocessing
 import os
-import random
 import site
 import subprocess
 import sys
-from datetime import timedelta, datetime
+from datetime import datetime
 
 from PyQt5.QtCore import QDateTime
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
     QVBoxLayout, QFileDialog, QListWidget, QMessageBox, QComboBox, QDialog,
-    QFormLayout, QDateTimeEdit, QDialogButtonBox, QListWidgetItem, QTextEdit, QInputDialog
+    QFormLayout, QDateTimeEdit, QDialogButtonBox, QListWidgetItem, QTextEdit, QInputDialog, QCheckBox
 )
 
 from authors import ManageAuthorsDialog
+from branches.branch_overview_dialog import BranchOverviewDialog
 from callback import CallbackScriptBuilder
+from pipeline import FastExportPipeline, RemoteRewrite
+from rules.rules_dialog import RulesDialog
+from service import rewrite_plan
+from watcher import compute_delta
+from watcher.ref_watcher import RefWatcher
 
 CONFIG_PATH = "config.json"
 
@@ -114,7 +119,7 @@ def delete_temp_file(path):
 
 # ---------------------- 批量重写对话框 ----------------------
 class BulkRewriteDialog(QDialog):
-    def __init__(self):
+    def __init__(self, plan=None):
         super().__init__()
         self.setWindowTitle("批量重写提交作者与时间")
 
@@ -123,6 +128,9 @@ class BulkRewriteDialog(QDialog):
         for author in load_authors():
             item = QListWidgetItem(author)
             self.authors_list.addItem(item)
+            # 默认选中上次方案中的作者
+            if plan and author in plan["authors"]:
+                item.setSelected(True)
 
         self.base_commit = QLineEdit()
         self.base_commit.setPlaceholderText("commit hash的前7位")
@@ -137,6 +145,14 @@ class BulkRewriteDialog(QDialog):
         self.end_time.setCalendarPopup(True)
         self.end_time.setDateTime(QDateTime.currentDateTime())
         self.end_time.setDisplayFormat("yyyy-MM-dd")
+        # 默认沿用上次方案的时间范围
+        if plan and plan.get("start") and plan.get("end"):
+            self.start_time.setDateTime(QDateTime(datetime.fromisoformat(plan["start"])))
+            self.end_time.setDateTime(QDateTime(datetime.fromisoformat(plan["end"])))
+
+        self.incremental = QCheckBox("仅重写上次改写之后新增的提交")
+        self.incremental.setEnabled(plan is not None and plan.get("tip") is not None)
+        self.incremental.setChecked(self.incremental.isEnabled())
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
@@ -147,6 +163,7 @@ class BulkRewriteDialog(QDialog):
         layout.addRow("commit hash值:", self.base_commit)
         layout.addRow("开始时间:", self.start_time)
         layout.addRow("结束时间:", self.end_time)
+        layout.addRow(self.incremental)
         layout.addRow(buttons)
 
         self.setLayout(layout)
@@ -156,7 +173,7 @@ class BulkRewriteDialog(QDialog):
         start = self.start_time.dateTime().toPyDateTime()
         end = self.end_time.dateTime().toPyDateTime()
         base_commit = self.base_commit.text()
-        return authors, start, end, base_commit
+        return authors, start, end, base_commit, self.incremental.isChecked()
 
 
 # ---------------------- 编辑对话框 ----------------------
@@ -215,6 +232,7 @@ class GitCommitEditor(QWidget):
         super().__init__()
         self.remote_url = None
         self.current_branch = None
+        self.last_tip = None
         self.authors = load_authors()
         self.setWindowTitle("Git Commit Editor (全功能整合版)")
 
@@ -230,6 +248,9 @@ class GitCommitEditor(QWidget):
         self.branch_selector = QComboBox()
         self.branch_selector.currentIndexChanged.connect(self.load_commits)
 
+        self.branch_overview_button = QPushButton("分支概览")
+        self.branch_overview_button.clicked.connect(self.show_branch_overview)
+
         self.commit_listbox = QListWidget()
         self.commit_listbox.setContextMenuPolicy(Qt.CustomContextMenu)
         self.commit_listbox.customContextMenuRequested.connect(self.show_commit_context_menu)
@@ -241,6 +262,12 @@ class GitCommitEditor(QWidget):
         self.rewrite_button = QPushButton("批量随机重写历史")
         self.rewrite_button.clicked.connect(self.rewrite_commits_randomly)
 
+        self.rules_button = QPushButton("按规则批量改写")
+        self.rules_button.clicked.connect(self.rewrite_commits_by_rules)
+
+        self.remote_rewrite_button = QPushButton("按规则改写远程仓库")
+        self.remote_rewrite_button.clicked.connect(self.rewrite_remote_by_rules)
+
         self.author_manager_btn = QPushButton("管理作者")
         self.author_manager_btn.clicked.connect(self.author_manager)
 
@@ -250,15 +277,22 @@ class GitCommitEditor(QWidget):
         layout.addWidget(browse_button)
         layout.addWidget(QLabel("选择分支:"))
         layout.addWidget(self.branch_selector)
+        layout.addWidget(self.branch_overview_button)
         # layout.addWidget(load_button)
         layout.addWidget(self.commit_listbox)
         layout.addWidget(self.rewrite_button)
+        layout.addWidget(self.rules_button)
         layout.addWidget(self.push_button)
+        layout.addWidget(self.remote_rewrite_button)
         layout.addWidget(self.author_manager_btn)
 
         self.setLayout(layout)
         self.root_commit_log = ''
 
+        # 外部的 git commit/fetch/checkout 也能反映到提交列表
+        self.ref_watcher = RefWatcher(self)
+        self.ref_watcher.refs_changed.connect(self.on_refs_changed)
+
         # 设置显示框的初始大小
         self.setMinimumHeight(800)
         self.setMinimumWidth(500)
@@ -329,6 +363,17 @@ class GitCommitEditor(QWidget):
             self.branch_selector.setCurrentText(self.current_branch)
             self.load_commits()
         self.get_remote_url()
+        self.ref_watcher.watch(repo)
+
+    def show_branch_overview(self):
+        repo = self.repo_path.text()
+        if not os.path.isdir(repo):
+            return
+        dialog = BranchOverviewDialog(repo)
+        if dialog.exec_():
+            branch = dialog.get_selected_branch()
+            if branch and self.branch_selector.findText(branch) >= 0:
+                self.branch_selector.setCurrentText(branch)
 
     def load_commits(self):
         repo = self.repo_path.text()
@@ -341,6 +386,12 @@ class GitCommitEditor(QWidget):
             QMessageBox.critical(self, "失败", result.stderr)
             return
         self.current_branch = branch
+        self.reload_commit_list()
+
+    def reload_commit_list(self):
+        repo = self.repo_path.text()
+        branch = self.current_branch
+        self.last_tip = run_git_command(["git", "rev-parse", branch], cwd=repo)
         cmd = ["git", "log", branch, "--pretty=format:%h %an <%ae> %ad %s %d", "--date=iso"]
         output = run_git_command(cmd, cwd=repo)
         self.commit_listbox.clear()
@@ -352,49 +403,73 @@ class GitCommitEditor(QWidget):
         self.root_commit_log = commit_logs[-1].split(' ')[0]
         self.commit_listbox.addItems(commit_logs)
 
+    def refresh_commits(self):
+        """
+        只把分支 tip 变化带来的增量应用到提交列表：新提交加到前面，被改写的提交按 commit-map 替换
+        """
+        repo = self.repo_path.text()
+        if not self.current_branch or not os.path.isdir(repo):
+            return
+        count = self.commit_listbox.count()
+        shown = [self.commit_listbox.item(i).text().split(' ')[0] for i in range(count)]
+        delta = compute_delta(repo, self.current_branch, self.last_tip, shown)
+        if delta is None:
+            return
+        if delta.reload:
+            self.reload_commit_list()
+            return
+        for i in reversed(range(count)):
+            item = self.commit_listbox.item(i)
+            commit_hash = item.text().split(' ')[0]
+            if commit_hash in delta.remove:
+                self.commit_listbox.takeItem(i)
+            elif commit_hash in delta.replace:
+                item.setText(delta.replace[commit_hash])
+        self.commit_listbox.insertItems(0, delta.prepend)
+        self.last_tip = delta.tip
+        if self.commit_listbox.count():
+            self.root_commit_log = self.commit_listbox.item(self.commit_listbox.count() - 1).text().split(' ')[0]
+
+    def on_refs_changed(self):
+        head = run_git_command(["git", "symbolic-ref", "--quiet", "--short", "HEAD"], cwd=self.repo_path.text())
+        if head and head != self.current_branch:
+            # 在终端里切换了分支：只同步下拉框和提交列表，屏蔽信号避免再触发 checkout
+            self.current_branch = head
+            self.branch_selector.blockSignals(True)
+            if self.branch_selector.findText(head) < 0:
+                self.branch_selector.addItem(head)
+            self.branch_selector.setCurrentText(head)
+            self.branch_selector.blockSignals(False)
+            self.reload_commit_list()
+        else:
+            self.refresh_commits()
+
     def rewrite_commits_randomly(self):
         if not git_filter_repo_execute_file():
             QMessageBox.critical(self, "错误", "请先安装 git-filter-repo 工具")
             return
-        dialog = BulkRewriteDialog()
+        repo = self.repo_path.text()
+        branch = self.branch_selector.currentText()
+        dialog = BulkRewriteDialog(rewrite_plan.load_plan(repo, branch))
         if dialog.exec_():
-            authors, start, end, base_commit = dialog.get_values()
+            authors, start, end, base_commit, incremental = dialog.get_values()
             if not len(authors):
                 QMessageBox.critical(self, "失败", "请选择作者")
                 return
-            repo = self.repo_path.text()
-            branch = self.branch_selector.currentText()
-
-            commits = run_git_command(["git", "rev-list", branch], cwd=repo).splitlines()
-
-            new_commits = [commit[:7] for commit in commits]
-            if base_commit != "" and base_commit in new_commits:
-                index = new_commits.index(base_commit)
-                index = index + 1 if index < (len(commits) - 1) else -1
-                commits = commits[:index]
-
-            total = len(commits)
-            seconds_range = int((end - start).total_seconds())
-            time_steps = sorted([random.randint(0, seconds_range) for _ in range(total)], reverse=True)
-            commit_changes = {}
-            # 忽略第一次提交，因为无法修改
-            for i, commit in enumerate(commits):
-                _, date, message = self.get_commit_info(commit)
-                commit_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S +0800")
-                rand_time = start + timedelta(seconds=time_steps[i])
-                commit_date = datetime(year=rand_time.year, month=rand_time.month, day=rand_time.day,
-                                       hour=commit_date.hour, minute=commit_date.minute, second=commit_date.second)
-                formatted_date = commit_date.strftime("%Y-%m-%dT%H:%M:%S")
-                rand_author = random.choice(authors)
-                name = rand_author.split("<")[0].strip()
-                email = rand_author.split("<")[1].strip(" >")
-
-                commit_changes[commit[:7]] = {
-                    "name": name,
-                    "email": email,
-                    "date": formatted_date,
-                    "message": message,
-                }
+
+            try:
+                commit_changes, extra_args, plan = rewrite_plan.prepare_random_rewrite(
+                    repo, branch, authors, start, end, base_commit, incremental)
+            except ValueError as e:
+                QMessageBox.warning(self, "提示", str(e))
+                return
+            except Exception as e:
+                logging.error("生成改写方案失败:", exc_info=e)
+                QMessageBox.critical(self, "失败", str(e))
+                return
+            if not commit_changes:
+                QMessageBox.information(self, "提示", "没有需要改写的新提交")
+                return
             callback_path = os.path.join(self.repo_path.text(), "rewrite_callback.py")
             CallbackScriptBuilder.build_bulk_commit_callback(callback_path, commit_changes)
             try:
@@ -402,12 +477,13 @@ class GitCommitEditor(QWidget):
                     "git-filter-repo",
                     "--commit-callback", callback_path
                     , "--force"
-                ], encoding='utf-8',
+                ] + extra_args, encoding='utf-8',
                     errors='replace',cwd=self.repo_path.text(), capture_output=True, text=True)
 
                 if result.returncode == 0:
+                    rewrite_plan.finish_random_rewrite(repo, branch, plan)
                     self.reset_remote_url()
-                    self.load_commits()
+                    self.refresh_commits()
                     QMessageBox.information(self, "成功", "提交修改完成（使用 filter-repo）")
                 else:
                     QMessageBox.critical(self, "失败", result.stderr)
@@ -417,6 +493,67 @@ class GitCommitEditor(QWidget):
             finally:
                 os.remove(callback_path)
 
+    def rewrite_commits_by_rules(self):
+        dialog = RulesDialog(config_path=CONFIG_PATH)
+        if not dialog.exec_():
+            return
+        rule_set = dialog.get_rule_set()
+        if dialog.use_pipeline():
+            try:
+                stats = FastExportPipeline(self.repo_path.text(), rules_spec=rule_set.to_spec()).run()
+                self.refresh_commits()
+                QMessageBox.information(self, "成功", "规则改写完成（多进程流水线）\n" + stats.summary())
+            except Exception as e:
+                logging.error("规则改写失败:", exc_info=e)
+                QMessageBox.critical(self, "失败", str(e))
+            return
+        if not git_filter_repo_execute_file():
+            QMessageBox.critical(self, "错误", "请先安装 git-filter-repo 工具")
+            return
+        callback_path = os.path.join(self.repo_path.text(), "rules_callback.py")
+        if not CallbackScriptBuilder.build_rules_callback(callback_path, rule_set.to_spec()):
+            QMessageBox.critical(self, "失败", "生成 callback 脚本失败")
+            return
+        try:
+            result = subprocess.run([
+                "git-filter-repo",
+                "--commit-callback", callback_path
+                , "--force"
+            ], encoding='utf-8',
+                errors='replace', cwd=self.repo_path.text(), capture_output=True, text=True)
+
+            if result.returncode == 0:
+                self.reset_remote_url()
+                self.refresh_commits()
+                QMessageBox.information(self, "成功", "规则改写完成（使用 filter-repo）")
+            else:
+                QMessageBox.critical(self, "失败", result.stderr)
+        except Exception as e:
+            logging.error("规则改写失败:", exc_info=e)
+            QMessageBox.critical(self, "失败", str(e))
+        finally:
+            delete_temp_file(callback_path)
+
+    def rewrite_remote_by_rules(self):
+        remote_url, ok = QInputDialog.getText(self, "输入远程仓库地址",
+                                              "请输入远程仓库地址（如 https://xxx.git 或 git@host:xxx.git）")
+        if not ok or remote_url.strip() == "":
+            return
+        dialog = RulesDialog(config_path=CONFIG_PATH)
+        if not dialog.exec_():
+            return
+        if QMessageBox.question(self, "确认", "改写后会强推所有分支和标签，原来的提交记录将丢失，确定继续吗？",
+                                QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
+            return
+        try:
+            job = RemoteRewrite(remote_url.strip(), rules_spec=dialog.get_rule_set().to_spec())
+            stats = job.run()
+            QMessageBox.information(self, "成功", f"远程仓库改写完成，更新了 {job.updated_refs} 个引用\n"
+                                                  + stats.summary())
+        except Exception as e:
+            logging.error("远程仓库改写失败:", exc_info=e)
+            QMessageBox.critical(self, "失败", str(e))
+
     def push_force(self):
         remote_url, ok = QInputDialog.getText(self, "输入远程仓库地址",
                                               "请输入远程仓库地址（如 origin 或 https://xxx.git）", text="origin")
@@ -480,7 +617,7 @@ class GitCommitEditor(QWidget):
 
                 if result.returncode == 0:
                     self.reset_remote_url()
-                    self.load_commits()
+                    self.refresh_commits()
                     QMessageBox.information(self, "成功", "提交修改完成（使用 filter-repo）")
                 else:
                     logging.error(f"edit commit failed: {selected_commit}", result.stderr)
@@ -583,6 +720,8 @@ scripts_dirs = get_script_path()
 logging.info(f"script path: {scripts_dirs}")
 
 if __name__ == '__main__':
+    # 打包为 exe 后多进程流水线需要
+    multiprocessing.freeze_support()
     try:
         app = QApplication(sys.argv)
         editor = GitCommitEditor()
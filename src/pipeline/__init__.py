@@ -0,0 +1,4 @@
+from .fast_pipeline import FastExportPipeline, PipelineError, PipelineStats
+from .remote_rewrite import RemoteRewrite, TreeOnlyPipeline
+
+__all__ = ['FastExportPipeline', 'PipelineError', 'PipelineStats', 'RemoteRewrite', 'TreeOnlyPipeline']
\ No newline at end of file
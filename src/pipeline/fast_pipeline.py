@@ -0,0 +1,287 @@
+import collections
+import multiprocessing
+import os
+import re
+import subprocess
+import time
+from datetime import datetime, timezone, timedelta
+
+from rules.rule_engine import apply_rules, compile_rules
+from service.repo_ops import git_startupinfo, git_output
+
+# fast-export 流中的顶层命令，出现在行首时表示新的一条记录开始
+TOP_LEVEL_COMMANDS = (b"blob", b"commit ", b"reset ", b"tag ", b"progress ", b"feature ",
+                      b"option ", b"checkpoint", b"done")
+IDENT_LINE = re.compile(rb"^(author|committer) (?:(.*) )?<(.*)> (\d+ [+-]\d{4})$")
+
+_worker_state = {}
+
+
+class PipelineError(Exception):
+    pass
+
+
+class CommitRecord:
+    """
+    fast-export 中的一条提交，字段名与 git-filter-repo 的 commit 对象一致，
+    这样 RuleSet 的运行时可以原样作用在两者上
+    """
+
+    def __init__(self, lines):
+        self.head, self.tail = [], []
+        self.mark = None
+        self.original_id = b""
+        self.author_name = self.author_email = self.author_date = None
+        self.committer_name = self.committer_email = self.committer_date = None
+        self.message = b""
+        index = 0
+        while index < len(lines):
+            line = lines[index]
+            index += 1
+            match = IDENT_LINE.match(line.rstrip(b"\n"))
+            if match:
+                kind = match.group(1).decode()
+                setattr(self, kind + "_name", match.group(2) or b"")
+                setattr(self, kind + "_email", match.group(3))
+                setattr(self, kind + "_date", match.group(4))
+                self.head.append(kind)
+            elif line.startswith(b"data "):
+                self.message = lines[index]
+                self.tail = lines[index + 1:]
+                break
+            else:
+                if line.startswith(b"mark :"):
+                    self.mark = line[len(b"mark "):].strip()
+                elif line.startswith(b"original-oid "):
+                    self.original_id = line[len(b"original-oid "):].strip()
+                self.head.append(line)
+
+    def dump(self):
+        parts = []
+        for line in self.head:
+            if line in ("author", "committer"):
+                name = getattr(self, line + "_name")
+                ident = (name + b" " if name else b"") + b"<" + getattr(self, line + "_email") + b">"
+                parts.append(line.encode() + b" " + ident + b" " + getattr(self, line + "_date") + b"\n")
+            else:
+                parts.append(line)
+        parts.append(b"data %d\n" % len(self.message))
+        parts.append(self.message)
+        parts.extend(self.tail)
+        return b"".join(parts)
+
+
+def apply_change(commit, change):
+    """
+    与 CallbackScriptBuilder.build_bulk_commit_callback 生成的脚本行为一致
+    """
+    commit.author_name = commit.committer_name = change["name"].encode("utf-8")
+    commit.author_email = commit.committer_email = change["email"].encode("utf-8")
+    dt = datetime.strptime(change["date"], "%Y-%m-%dT%H:%M:%S")
+    dt = dt.replace(tzinfo=timezone(timedelta(hours=8)))
+    commit.author_date = commit.committer_date = f"{int(dt.timestamp())} +0800".encode("utf-8")
+    commit.message = change["message"].encode("utf-8")
+
+
+def _init_worker(commit_changes, rules_spec):
+    # 每个工作进程只编译一次规则
+    _worker_state["changes"] = commit_changes or {}
+    _worker_state["rules"] = None
+    if rules_spec:
+        _worker_state["rules"] = (compile_rules(rules_spec), apply_rules)
+
+
+def _transform_batch(records):
+    started = time.perf_counter()
+    changes, rules = _worker_state["changes"], _worker_state["rules"]
+    output, marks, commits = [], [], 0
+    for record in records:
+        if not record[0].startswith(b"commit "):
+            output.append(b"".join(record))
+            continue
+        commit = CommitRecord(record)
+        change = changes.get(commit.original_id[:7].decode())
+        if change is not None:
+            apply_change(commit, change)
+        if rules is not None:
+            rules[1](rules[0], commit)
+        if commit.mark is not None and commit.original_id:
+            marks.append((commit.mark, commit.original_id))
+        output.append(commit.dump())
+        commits += 1
+    return b"".join(output), marks, commits, time.perf_counter() - started
+
+
+class PipelineStats:
+    def __init__(self, workers):
+        self.workers = workers
+        self.commits = 0
+        self.export_seconds = 0.0
+        self.transform_seconds = 0.0
+        self.import_seconds = 0.0
+        self.total_seconds = 0.0
+
+    @staticmethod
+    def rate(count, seconds):
+        return count / seconds if seconds > 0 else float("inf")
+
+    def summary(self):
+        # 转换阶段按工作进程数折算成并行后的耗时
+        transform_wall = self.transform_seconds / max(self.workers, 1)
+        return (f"提交数: {self.commits}，工作进程: {self.workers}\n"
+                f"导出: {self.rate(self.commits, self.export_seconds):.0f} 提交/秒\n"
+                f"转换: {self.rate(self.commits, transform_wall):.0f} 提交/秒\n"
+                f"导入: {self.rate(self.commits, self.import_seconds):.0f} 提交/秒\n"
+                f"总计: {self.rate(self.commits, self.total_seconds):.0f} 提交/秒（{self.total_seconds:.1f} 秒）")
+
+
+class FastExportPipeline:
+    """
+    git fast-export → 多进程转换提交记录（保持流顺序）→ git fast-import
+    commit_changes 与 CallbackScriptBuilder.build_bulk_commit_callback 使用同样的格式，
+    rules_spec 为 RuleSet.to_spec() 的结果；导出时不带文件内容（--no-data），只改写提交
+    """
+
+    def __init__(self, repo, commit_changes=None, rules_spec=None, refs=None, workers=None, batch_size=256):
+        self.repo = repo
+        self.commit_changes = commit_changes or {}
+        self.rules_spec = rules_spec
+        self.refs = refs or ["--all"]
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_pending = self.workers * 2
+        self.stats = PipelineStats(self.workers)
+
+    def read_batches(self, stream):
+        batch, record = [], None
+        while True:
+            started = time.perf_counter()
+            line = stream.readline()
+            if line and record is not None and not line.startswith(TOP_LEVEL_COMMANDS):
+                record.append(line)
+                if line.startswith(b"data "):
+                    record.append(stream.read(int(line[len(b"data "):])))
+                self.stats.export_seconds += time.perf_counter() - started
+                continue
+            if record is not None:
+                batch.append(record)
+            record = [line] if line else None
+            if line.startswith(b"data "):
+                record.append(stream.read(int(line[len(b"data "):])))
+            self.stats.export_seconds += time.perf_counter() - started
+            if batch and (len(batch) >= self.batch_size or record is None):
+                yield batch
+                batch = []
+            if record is None:
+                return
+
+    def start_export(self):
+        """
+        启动导出阶段，返回按批次产出记录（每条记录为行的列表）的迭代器
+        """
+        self.export = subprocess.Popen(
+            ["git", "-c", "core.quotepath=false", "fast-export", "--show-original-ids", "--no-data",
+             "--signed-tags=strip", "--tag-of-filtered-object=rewrite", "--fake-missing-tagger",
+             "--reference-excluded-parents", "--reencode=yes", "--use-done-feature"] + self.refs,
+            cwd=self.repo, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=git_startupinfo())
+        return self.read_batches(self.export.stdout)
+
+    def finish_export(self):
+        if self.export.wait() != 0:
+            raise PipelineError(self.export.stderr.read().decode("utf-8", errors="replace"))
+
+    def abort_export(self):
+        self.export.kill()
+        self.export.wait()
+
+    def ordered_results(self, pool, batches):
+        """
+        与 pool.imap 一样按顺序返回结果，但最多只有 max_pending 个批次在处理中；
+        导入跟不上时暂停读取导出流，内存占用不会随提交数增长
+        """
+        pending = collections.deque()
+        for batch in batches:
+            pending.append(pool.apply_async(_transform_batch, (batch,)))
+            if len(pending) >= self.max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+    def run(self):
+        started = time.perf_counter()
+        git_dir = git_output(["rev-parse", "--absolute-git-dir"], self.repo)
+        marks_path = os.path.join(git_dir, "git-commit-edit-marks")
+        batches = self.start_export()
+        fast_import = subprocess.Popen(
+            ["git", "fast-import", "--force", "--quiet", "--date-format=raw-permissive",
+             f"--export-marks={marks_path}"],
+            cwd=self.repo, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            startupinfo=git_startupinfo())
+
+        marks = []
+        pool = None
+        completed = False
+        try:
+            if self.workers > 1:
+                pool = multiprocessing.Pool(self.workers, _init_worker, (self.commit_changes, self.rules_spec))
+                results = self.ordered_results(pool, batches)
+            else:
+                _init_worker(self.commit_changes, self.rules_spec)
+                results = map(_transform_batch, batches)
+            for data, batch_marks, commits, seconds in results:
+                self.stats.commits += commits
+                self.stats.transform_seconds += seconds
+                marks.extend(batch_marks)
+                write_started = time.perf_counter()
+                fast_import.stdin.write(data)
+                self.stats.import_seconds += time.perf_counter() - write_started
+            completed = True
+        except BrokenPipeError:
+            # fast-import 提前退出，真正的错误信息在它的 stderr 中
+            pass
+        finally:
+            if pool is not None:
+                if completed:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+            if not completed:
+                self.abort_export()
+            wait_started = time.perf_counter()
+            try:
+                fast_import.stdin.close()
+            except BrokenPipeError:
+                pass
+            import_code = fast_import.wait()
+            self.stats.import_seconds += time.perf_counter() - wait_started
+
+        if import_code != 0 or not completed:
+            raise PipelineError(fast_import.stderr.read().decode("utf-8", errors="replace")
+                                or "git fast-import 提前退出")
+        self.finish_export()
+
+        self.write_commit_map(git_dir, marks, marks_path)
+        if git_output(["rev-parse", "--is-bare-repository"], self.repo) != "true":
+            git_output(["reset", "--hard", "--quiet"], self.repo)
+        self.stats.total_seconds = time.perf_counter() - started
+        return self.stats
+
+    @staticmethod
+    def write_commit_map(git_dir, marks, marks_path):
+        """
+        写出与 git-filter-repo 相同格式的 .git/filter-repo/commit-map（旧hash 新hash）
+        """
+        new_ids = {}
+        with open(marks_path, "rb") as f:
+            for line in f:
+                mark, _, new_id = line.strip().partition(b" ")
+                new_ids[mark] = new_id
+        os.remove(marks_path)
+        map_dir = os.path.join(git_dir, "filter-repo")
+        os.makedirs(map_dir, exist_ok=True)
+        with open(os.path.join(map_dir, "commit-map"), "wb") as f:
+            f.write(b"%-40s %s\n" % (b"old", b"new"))
+            for mark, original_id in marks:
+                if mark in new_ids:
+                    f.write(original_id + b" " + new_ids[mark] + b"\n")
@@ -0,0 +1,160 @@
+import os
+import pathlib
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+
+from service.repo_ops import git_startupinfo, git_output, run_git
+from .fast_pipeline import FastExportPipeline, PipelineError
+from .send_pack import CommitOnlyPush
+
+IMPORT_REF = b"refs/git-commit-edit/import"
+
+
+class TreeOnlyPipeline(FastExportPipeline):
+    """
+    不经过 git fast-export，直接从提交对象生成导入流，每个提交用
+    deleteall + M 040000 <tree> "" 引用原来的根 tree，
+    fast-import 只读取 tree 而不会访问 blob，适用于 --filter=blob:none 的部分克隆
+    """
+
+    def start_export(self):
+        self.rev_list = subprocess.Popen(
+            ["git", "rev-list", "--reverse", "--topo-order"] + self.refs,
+            cwd=self.repo, stdout=subprocess.PIPE, stderr=subprocess.PIPE, startupinfo=git_startupinfo())
+        self.cat_file = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=self.repo, stdin=self.rev_list.stdout, stdout=subprocess.PIPE, startupinfo=git_startupinfo())
+        self.rev_list.stdout.close()
+        return self.read_commit_batches()
+
+    def finish_export(self):
+        if self.rev_list.wait() != 0:
+            raise PipelineError(self.rev_list.stderr.read().decode("utf-8", errors="replace"))
+        self.cat_file.wait()
+
+    def abort_export(self):
+        for process in (self.rev_list, self.cat_file):
+            process.kill()
+            process.wait()
+
+    @staticmethod
+    def commit_record(oid, content, marks):
+        headers, _, message = content.partition(b"\n\n")
+        tree, parents, extra = None, [], []
+        author = committer = b""
+        for line in headers.split(b"\n"):
+            if line.startswith(b"tree "):
+                tree = line[len(b"tree "):]
+            elif line.startswith(b"parent "):
+                parents.append(line[len(b"parent "):])
+            elif line.startswith(b"author "):
+                author = line
+            elif line.startswith(b"committer "):
+                committer = line
+            elif line.startswith(b"encoding "):
+                extra.append(line + b"\n")
+            # gpgsig/mergetag 及其续行丢弃，签名在改写后本来就会失效
+        mark = len(marks) + 1
+        marks[oid] = mark
+        record = [b"commit " + IMPORT_REF + b"\n", b"mark :%d\n" % mark, b"original-oid " + oid + b"\n",
+                  author + b"\n", committer + b"\n"] + extra + [b"data %d\n" % len(message), message]
+        for index, parent in enumerate(parents):
+            keyword = b"from " if index == 0 else b"merge "
+            record.append(keyword + (b":%d" % marks[parent] if parent in marks else parent) + b"\n")
+        record += [b"deleteall\n", b"M 040000 " + tree + b' ""\n', b"\n"]
+        # 根提交之前重置导入分支，否则会被接到上一个提交后面
+        return record if parents else [[b"reset " + IMPORT_REF + b"\n"], record]
+
+    def ref_records(self, marks):
+        records = []
+        output = git_output(["for-each-ref", "--format=%(refname) %(objecttype) %(objectname) %(*objectname)",
+                             "refs/heads", "refs/tags"], self.repo)
+        for line in output.splitlines():
+            parts = line.split()
+            ref, object_type, oid = parts[0].encode(), parts[1], parts[2].encode()
+            if object_type == "commit" and oid in marks:
+                records.append([b"reset " + ref + b"\n", b"from :%d\n" % marks[oid], b"\n"])
+            elif object_type == "tag" and len(parts) == 4 and parts[3].encode() in marks:
+                content = subprocess.run(["git", "cat-file", "tag", parts[2]], cwd=self.repo,
+                                         capture_output=True, startupinfo=git_startupinfo()).stdout
+                headers, _, message = content.partition(b"\n\n")
+                message = message.split(b"-----BEGIN PGP SIGNATURE-----")[0]
+                tagger = [h + b"\n" for h in headers.split(b"\n") if h.startswith(b"tagger ")]
+                records.append([b"tag " + ref[len(b"refs/tags/"):] + b"\n",
+                                b"from :%d\n" % marks[parts[3].encode()]] + tagger +
+                               [b"data %d\n" % len(message), message, b"\n"])
+        return records
+
+    def read_commit_batches(self):
+        marks, batch = {}, [[b"feature done\n"]]
+        stream = self.cat_file.stdout
+        while True:
+            started = time.perf_counter()
+            header = stream.readline().split()
+            if len(header) != 3:
+                break
+            content = stream.read(int(header[2]))
+            stream.read(1)
+            record = self.commit_record(header[0], content, marks)
+            if isinstance(record[0], list):
+                batch.extend(record)
+            else:
+                batch.append(record)
+            self.stats.export_seconds += time.perf_counter() - started
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        started = time.perf_counter()
+        batch.extend(self.ref_records(marks))
+        batch.append([b"done\n"])
+        self.stats.export_seconds += time.perf_counter() - started
+        yield batch
+
+    def run(self):
+        stats = super().run()
+        run_git(["update-ref", "-d", IMPORT_REF.decode()], self.repo)
+        return stats
+
+
+def remove_tree(path):
+    # Windows 下对象文件是只读的，需要先去掉只读属性
+    def on_error(func, target, _):
+        os.chmod(target, stat.S_IWRITE)
+        func(target)
+
+    shutil.rmtree(path, onerror=on_error)
+
+
+class RemoteRewrite:
+    """
+    改写不在本地的远程仓库：--filter=blob:none 的裸部分克隆（不下载文件内容）→
+    TreeOnlyPipeline 只改写提交 → 只把新提交和标签对象强推回远程
+    """
+
+    def __init__(self, url, commit_changes=None, rules_spec=None, workers=None):
+        self.url = url
+        self.commit_changes = commit_changes
+        self.rules_spec = rules_spec
+        self.workers = workers
+        self.updated_refs = 0
+
+    def run(self, push=True):
+        work_dir = tempfile.mkdtemp(prefix="git_commit_edit_remote_")
+        repo = os.path.join(work_dir, "repo.git")
+        try:
+            # 本地路径克隆会忽略 --filter，需要改用 file:// 协议
+            url = pathlib.Path(self.url).resolve().as_uri() if os.path.isdir(self.url) else self.url
+            result = run_git(["clone", "--bare", "--filter=blob:none", url, repo], work_dir)
+            if result.returncode != 0:
+                raise PipelineError(result.stderr)
+            expected_refs, _ = CommitOnlyPush.read_refs(repo)
+            stats = TreeOnlyPipeline(repo, self.commit_changes, self.rules_spec,
+                                     refs=["--branches", "--tags"], workers=self.workers).run()
+            if push:
+                self.updated_refs = CommitOnlyPush(repo, self.url, expected_refs).run()
+            return stats
+        finally:
+            remove_tree(work_dir)
@@ -0,0 +1,276 @@
+import base64
+import os
+import shlex
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from service.repo_ops import git_startupinfo, git_output
+from .fast_pipeline import PipelineError
+
+ZERO_ID = b"0" * 40
+FLUSH = b"0000"
+
+
+def pkt_line(data):
+    return b"%04x" % (len(data) + 4) + data
+
+
+def read_pkt_lines(read):
+    """
+    读取 pkt-line 直到 flush，read 为 read(n) 函数
+    """
+    lines = []
+    while True:
+        size = read(4)
+        if len(size) < 4:
+            return lines
+        length = int(size, 16)
+        if length == 0:
+            return lines
+        lines.append(read(length - 4).rstrip(b"\n"))
+
+
+def bytes_reader(data):
+    position = [0]
+
+    def read(size):
+        chunk = data[position[0]:position[0] + size]
+        position[0] += size
+        return chunk
+
+    return read
+
+
+def parse_advertisement(lines):
+    refs, capabilities = {}, set()
+    for index, line in enumerate(lines):
+        if index == 0 and b"\0" in line:
+            line, caps = line.split(b"\0", 1)
+            capabilities = set(caps.split())
+        if line.startswith(b"shallow "):
+            continue
+        oid, ref = line.split(b" ", 1)
+        if ref != b"capabilities^{}":
+            refs[ref] = oid
+    return refs, capabilities
+
+
+class CommitOnlyPush:
+    """
+    只推送改写产生的提交和附注标签对象。
+    TreeOnlyPipeline 改写后 tree/blob 都没有变化，远程仓库早已拥有；
+    而 git push 对于与远程完全不相交的新历史会重新打包所有 tree/blob，
+    在部分克隆中还会先把所有 blob 下载回来，因此这里直接走 receive-pack 协议
+    """
+
+    def __init__(self, repo, url, expected_refs=None):
+        """
+        expected_refs 为改写前克隆到的 {引用: hash}，作为推送时的旧值（租约），
+        远程引用在此之后被别人更新过时推送失败，而不是覆盖掉别人的提交
+        """
+        self.repo = repo
+        self.url = url
+        self.expected_refs = expected_refs
+
+    @staticmethod
+    def read_refs(repo):
+        refs, tags = {}, set()
+        output = git_output(["for-each-ref", "--format=%(refname) %(objectname) %(objecttype)",
+                             "refs/heads", "refs/tags"], repo)
+        for line in output.splitlines():
+            ref, oid, object_type = line.split()
+            refs[ref.encode()] = oid.encode()
+            if object_type == "tag":
+                tags.add(oid.encode())
+        return refs, tags
+
+    def build_request(self, remote_refs, capabilities):
+        """
+        返回 (更新的引用数, 请求内容)，没有需要更新的引用时请求为 None
+        """
+        local_refs, tags = self.read_refs(self.repo)
+        expected_refs = remote_refs if self.expected_refs is None else self.expected_refs
+        updates = [(expected_refs.get(ref, ZERO_ID), oid, ref)
+                   for ref, oid in sorted(local_refs.items()) if remote_refs.get(ref) != oid]
+        if not updates:
+            return 0, None
+        stale = [ref.decode("utf-8", errors="replace") for old, _, ref in updates
+                 if remote_refs.get(ref, ZERO_ID) != old]
+        if stale:
+            raise PipelineError("以下远程引用在克隆之后被更新，已取消推送，请重新执行：\n" + "\n".join(stale))
+        wanted = [b"report-status", b"ofs-delta"]
+        caps = b" ".join(cap for cap in wanted if cap in capabilities)
+        commands = b"".join(pkt_line(b"%s %s %s%s\n" % (old, new, ref, b"\0" + caps if index == 0 else b""))
+                            for index, (old, new, ref) in enumerate(updates))
+
+        # 新提交 = 本地新 tip 可达、远程已有 tip 不可达的提交（只遍历提交，不读取 tree/blob）
+        revs = [new for _, new, _ in updates] + [b"^" + oid for oid in set(remote_refs.values())]
+        objects = subprocess.run(
+            ["git", "rev-list", "--ignore-missing", "--stdin"], cwd=self.repo, input=b"\n".join(revs) + b"\n",
+            capture_output=True, startupinfo=git_startupinfo()).stdout.split()
+        objects += [new for _, new, _ in updates if new in tags]
+        pack_args = ["git", "pack-objects", "--stdout", "-q"]
+        if b"ofs-delta" in capabilities:
+            pack_args.append("--delta-base-offset")
+        pack = subprocess.run(pack_args, cwd=self.repo, input=b"\n".join(objects) + b"\n",
+                              capture_output=True, startupinfo=git_startupinfo())
+        if pack.returncode != 0:
+            raise PipelineError(pack.stderr.decode("utf-8", errors="replace"))
+        return len(updates), commands + FLUSH + pack.stdout
+
+    @staticmethod
+    def check_report(lines):
+        errors = [line.decode("utf-8", errors="replace") for line in lines
+                  if line.startswith(b"ng ") or (line.startswith(b"unpack ") and line != b"unpack ok")]
+        if errors:
+            raise PipelineError("\n".join(errors))
+
+    def run(self):
+        parsed = urllib.parse.urlparse(self.url)
+        if parsed.scheme in ("http", "https"):
+            return self.push_http()
+        return self.push_process(self.receive_pack_command(parsed))
+
+    def receive_pack_command(self, parsed):
+        if parsed.scheme == "ssh":
+            return self.ssh_command(parsed.hostname if not parsed.username else f"{parsed.username}@{parsed.hostname}",
+                                    parsed.port, urllib.parse.unquote(parsed.path))
+        if parsed.scheme == "file":
+            path = urllib.parse.unquote(parsed.path)
+            # file:///C:/repo 在 Windows 下去掉盘符前的 /
+            if os.name == "nt" and path[2:3] == ":":
+                path = path[1:]
+            return ["git", "receive-pack", path]
+        # scp 风格：user@host:path（排除 Windows 盘符 C:\）
+        head, sep, path = self.url.partition(":")
+        if sep and "/" not in head and "\\" not in head and len(head) > 1:
+            return self.ssh_command(head, None, path)
+        return ["git", "receive-pack", self.url]
+
+    def ssh_command(self, host, port, path):
+        """
+        与 git 选择 ssh 程序的顺序一致：GIT_SSH_COMMAND（shell 命令）→ GIT_SSH（程序路径）→
+        core.sshCommand（shell 命令）→ ssh；plink/tortoiseplink 用 -P 指定端口
+        """
+        shell_command = os.environ.get("GIT_SSH_COMMAND")
+        program = None if shell_command else os.environ.get("GIT_SSH")
+        if not shell_command and not program:
+            shell_command = git_output(["config", "--get", "core.sshCommand"], self.repo)
+        if shell_command:
+            words = shlex.split(shell_command, posix=os.name != "nt")
+            # Windows 下 posix=False 会保留引号，如 "C:\Program Files\PuTTY\plink.exe"
+            words = [word[1:-1] if len(word) > 1 and word[0] == word[-1] == '"' else word for word in words]
+            program = words[0] if words else "ssh"
+        else:
+            program = program or "ssh"
+
+        variant = os.environ.get("GIT_SSH_VARIANT") or git_output(["config", "--get", "ssh.variant"], self.repo)
+        if not variant or variant == "auto":
+            variant = os.path.basename(program).lower()
+            variant = variant[:-len(".exe")] if variant.endswith(".exe") else variant
+        args = ["-batch"] if variant == "tortoiseplink" else []
+        if port:
+            args += ["-P" if variant in ("plink", "putty", "tortoiseplink") else "-p", str(port)]
+        args += [host, "git-receive-pack '%s'" % path.replace("'", "'\\''")]
+
+        if shell_command and os.name != "nt":
+            # 与 git 一样交给 shell 执行，命令里可以带管道、环境变量等
+            return ["sh", "-c", shell_command + ' "$@"', shell_command] + args
+        if shell_command:
+            return words + args
+        return [program] + args
+
+    def push_process(self, command):
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   startupinfo=git_startupinfo())
+        try:
+            remote_refs, capabilities = parse_advertisement(read_pkt_lines(process.stdout.read))
+            count, request = self.build_request(remote_refs, capabilities)
+            if request is not None:
+                process.stdin.write(request)
+            else:
+                process.stdin.write(FLUSH)
+            process.stdin.close()
+            if request is not None and b"report-status" in capabilities:
+                self.check_report(read_pkt_lines(process.stdout.read))
+        except PipelineError:
+            process.kill()
+            process.wait()
+            raise
+        except (BrokenPipeError, ValueError):
+            process.kill()
+            raise PipelineError(process.stderr.read().decode("utf-8", errors="replace") or "receive-pack 失败")
+        if process.wait() != 0:
+            raise PipelineError(process.stderr.read().decode("utf-8", errors="replace"))
+        return count
+
+    def credential(self, action, parsed, values=None):
+        description = f"protocol={parsed.scheme}\nhost={parsed.netloc.rsplit('@', 1)[-1]}\n" \
+                      f"path={parsed.path.lstrip('/')}\n"
+        if values:
+            description += "".join(f"{key}={value}\n" for key, value in values.items())
+        # 没有凭据助手时不要在终端里等待输入（打包后没有控制台）
+        env = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+        result = subprocess.run(["git", "credential", action], input=description + "\n", capture_output=True,
+                                text=True, env=env, startupinfo=git_startupinfo())
+        return dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+
+    def push_http(self):
+        parsed = urllib.parse.urlparse(self.url)
+        base_url = self.url.rstrip("/")
+        credentials = None
+        if parsed.username:
+            credentials = {"username": urllib.parse.unquote(parsed.username),
+                           "password": urllib.parse.unquote(parsed.password or "")}
+            base_url = base_url.replace(parsed.netloc, parsed.netloc.rsplit("@", 1)[-1], 1)
+
+        def request(path, data=None):
+            headers = {"User-Agent": "git/git-commit-edit"}
+            if data is not None:
+                headers["Content-Type"] = "application/x-git-receive-pack-request"
+                headers["Accept"] = "application/x-git-receive-pack-result"
+            if credentials:
+                token = f"{credentials['username']}:{credentials['password']}".encode("utf-8")
+                headers["Authorization"] = "Basic " + base64.b64encode(token).decode()
+            with urllib.request.urlopen(urllib.request.Request(base_url + path, data=data, headers=headers)) as f:
+                return f.read()
+
+        def auth_failed(e):
+            # 凭据助手给出的凭据被拒绝时通知它删除，下次重新询问
+            if e.code == 401 and credentials and not parsed.username:
+                self.credential("reject", parsed, credentials)
+            return PipelineError(str(e))
+
+        try:
+            advertisement = request("/info/refs?service=git-receive-pack")
+        except urllib.error.HTTPError as e:
+            if e.code != 401 or credentials:
+                raise PipelineError(str(e))
+            credentials = self.credential("fill", parsed)
+            if not credentials.get("username"):
+                raise PipelineError("远程仓库需要认证，但没有从 git credential 获取到用户名和密码，"
+                                    "请先配置凭据助手或在地址中带上用户名")
+            credentials.setdefault("password", "")
+            try:
+                advertisement = request("/info/refs?service=git-receive-pack")
+            except urllib.error.HTTPError as e:
+                raise auth_failed(e)
+
+        read = bytes_reader(advertisement)
+        lines = read_pkt_lines(read)
+        if lines and lines[0].startswith(b"# service="):
+            lines = read_pkt_lines(read)
+        remote_refs, capabilities = parse_advertisement(lines)
+        count, body = self.build_request(remote_refs, capabilities)
+        if body is not None:
+            try:
+                report = request("/git-receive-pack", body)
+            except urllib.error.HTTPError as e:
+                raise auth_failed(e)
+            if b"report-status" in capabilities:
+                self.check_report(read_pkt_lines(bytes_reader(report)))
+        if credentials and not parsed.username:
+            self.credential("approve", parsed, credentials)
+        return count
@@ -0,0 +1,4 @@
+# 对话框依赖 PyQt5，不在这里导入，无界面的守护进程和流水线只需要规则引擎
+from .rule_engine import RuleSet
+
+__all__ = ['RuleSet']
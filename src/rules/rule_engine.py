@@ -0,0 +1,160 @@
+import inspect
+import json
+import re
+
+
+# 规则运行时：下面四个函数既在本进程和工作进程中直接调用，也会通过 runtime_source()
+# 原样嵌入 git-filter-repo 的 callback 脚本，因此只能依赖 re，且所有字段都按 bytes 处理
+# （与 filter-repo 的 commit 对象一致）
+def compile_rules(spec):
+    identities = {}
+    for entry in spec.get("mailmap", []):
+        # 与 git mailmap 一致，旧名字和旧邮箱都不区分大小写
+        old_name = entry["old_name"].lower().encode("utf-8") if entry["old_name"] else None
+        identities[(entry["old_email"].lower().encode("utf-8"), old_name)] = (
+            entry["name"].encode("utf-8") if entry["name"] else None,
+            entry["email"].encode("utf-8") if entry["email"] else None,
+        )
+    messages = [(re.compile(pattern.encode("utf-8"), re.MULTILINE), replacement.encode("utf-8"))
+                for pattern, replacement in spec.get("messages", [])]
+    return {"identities": identities, "messages": messages, "date_shift": int(spec.get("date_shift", 0))}
+
+
+def map_identity(identities, name, email):
+    key = email.lower()
+    proper = identities.get((key, name.lower())) or identities.get((key, None))
+    if proper is None:
+        return name, email
+    return proper[0] or name, proper[1] or email
+
+
+def shift_date(date, seconds):
+    timestamp, tz = date.split(b" ", 1)
+    return str(int(timestamp) + seconds).encode("utf-8") + b" " + tz
+
+
+def apply_rules(rules, commit):
+    identities = rules["identities"]
+    if identities:
+        commit.author_name, commit.author_email = map_identity(
+            identities, commit.author_name, commit.author_email)
+        commit.committer_name, commit.committer_email = map_identity(
+            identities, commit.committer_name, commit.committer_email)
+    for pattern, replacement in rules["messages"]:
+        commit.message = pattern.sub(replacement, commit.message)
+    if rules["date_shift"]:
+        commit.author_date = shift_date(commit.author_date, rules["date_shift"])
+        commit.committer_date = shift_date(commit.committer_date, rules["date_shift"])
+
+
+def runtime_source() -> str:
+    """
+    规则运行时的源码，供 callback 脚本 exec；打包时需要带上 rule_engine.py 源文件
+    """
+    functions = (compile_rules, map_identity, shift_date, apply_rules)
+    return "import re\n\n\n" + "\n\n".join(inspect.getsource(function) for function in functions)
+
+
+MAILMAP_LINE = re.compile(
+    r"^\s*(?P<name>[^<]*?)\s*<(?P<email>[^>]*)>"
+    r"(?:\s*(?P<old_name>[^<]*?)\s*<(?P<old_email>[^>]*)>)?\s*(?:#.*)?$"
+)
+
+
+class RuleSet:
+    """
+    批量改写规则：mailmap 风格的身份映射、正则改写提交信息、整体平移提交时间
+    """
+
+    def __init__(self, mailmap=None, messages=None, date_shift=0):
+        self.mailmap = mailmap or []
+        self.messages = messages or []
+        self.date_shift = date_shift
+
+    @classmethod
+    def from_text(cls, mailmap_text: str, messages_text: str, date_shift_hours: int = 0) -> "RuleSet":
+        """
+        从界面/配置中的文本解析规则，格式错误时抛出 ValueError
+        """
+        return cls(
+            mailmap=cls.parse_mailmap(mailmap_text),
+            messages=cls.parse_messages(messages_text),
+            date_shift=int(date_shift_hours) * 3600,
+        )
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RuleSet":
+        rules = config.get("rules", {})
+        return cls.from_text(rules.get("mailmap", ""), rules.get("messages", ""), rules.get("date_shift_hours", 0))
+
+    @staticmethod
+    def parse_mailmap(text: str) -> list:
+        """
+        支持 git mailmap 的写法：
+            新名字 <新邮箱> 旧名字 <旧邮箱>
+            新名字 <新邮箱> <旧邮箱>
+            新名字 <邮箱>
+        """
+        entries = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip() == "" or line.strip().startswith("#"):
+                continue
+            match = MAILMAP_LINE.match(line)
+            if match is None:
+                raise ValueError(f"mailmap 第 {number} 行格式错误: {line}")
+            name, email = match.group("name"), match.group("email").strip()
+            old_name, old_email = match.group("old_name"), match.group("old_email")
+            if old_email is None:
+                # 只有一个邮箱时，表示按邮箱匹配并只替换名字
+                if name == "":
+                    raise ValueError(f"mailmap 第 {number} 行缺少名字: {line}")
+                entries.append({"name": name, "email": "", "old_name": "", "old_email": email})
+            else:
+                entries.append({"name": name, "email": email, "old_name": old_name or "",
+                                "old_email": old_email.strip()})
+        return entries
+
+    @staticmethod
+    def parse_messages(text: str) -> list:
+        """
+        每行一条规则：正则表达式 => 替换内容（替换内容可使用 \\1 引用分组）
+        """
+        rules = []
+        for number, line in enumerate(text.splitlines(), start=1):
+            if line.strip() == "" or line.strip().startswith("#"):
+                continue
+            if "=>" not in line:
+                raise ValueError(f"提交信息规则第 {number} 行缺少 =>: {line}")
+            pattern, replacement = line.split("=>", 1)
+            # 只去掉 => 两侧各一个空格，替换内容首尾的其他空格是有意保留的
+            pattern = pattern.lstrip()
+            pattern = pattern[:-1] if pattern.endswith(" ") else pattern
+            replacement = replacement[1:] if replacement.startswith(" ") else replacement
+            try:
+                re.compile(pattern.encode("utf-8"))
+            except re.error as e:
+                raise ValueError(f"提交信息规则第 {number} 行正则错误: {e}")
+            rules.append([pattern, replacement])
+        return rules
+
+    def is_empty(self) -> bool:
+        return not self.mailmap and not self.messages and not self.date_shift
+
+    def to_spec(self) -> dict:
+        """
+        可序列化的规则描述，用于写入 callback 脚本或在进程间传递
+        """
+        return {"mailmap": self.mailmap, "messages": self.messages, "date_shift": self.date_shift}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_spec(), ensure_ascii=False)
+
+    def compile(self) -> dict:
+        """
+        编译为查找表和预编译正则，供 apply 反复使用
+        """
+        return compile_rules(self.to_spec())
+
+    @staticmethod
+    def apply(compiled: dict, commit):
+        apply_rules(compiled, commit)
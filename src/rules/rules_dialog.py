@@ -0,0 +1,81 @@
+from PyQt5.QtWidgets import (
+    QDialog, QFormLayout, QTextEdit, QSpinBox, QDialogButtonBox, QMessageBox, QCheckBox
+)
+import json
+import os
+
+from .rule_engine import RuleSet
+
+
+class RulesDialog(QDialog):
+    def __init__(self, config_path, parent=None):
+        super().__init__(parent)
+        self.config_path = config_path
+        self.rule_set = None
+        self.setWindowTitle("按规则批量改写")
+        self.resize(600, 500)
+
+        self.mailmap_input = QTextEdit()
+        self.mailmap_input.setPlaceholderText("新名字 <新邮箱> 旧名字 <旧邮箱>\n新名字 <新邮箱> <旧邮箱>")
+
+        self.messages_input = QTextEdit()
+        self.messages_input.setPlaceholderText("^\\[JIRA-\\d+\\]\\s* => ")
+
+        self.date_shift_input = QSpinBox()
+        self.date_shift_input.setRange(-24 * 365 * 10, 24 * 365 * 10)
+        self.date_shift_input.setSuffix(" 小时")
+
+        self.pipeline_input = QCheckBox("多进程流水线（fast-export → 多进程转换 → fast-import）")
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.save_rules)
+        buttons.rejected.connect(self.reject)
+
+        layout = QFormLayout()
+        layout.addRow("作者映射（mailmap）:", self.mailmap_input)
+        layout.addRow("提交信息（正则 => 替换）:", self.messages_input)
+        layout.addRow("时间平移:", self.date_shift_input)
+        layout.addRow(self.pipeline_input)
+        layout.addRow(buttons)
+        self.setLayout(layout)
+
+        self.load_rules()
+
+    def load_config(self):
+        if os.path.exists(self.config_path):
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    def load_rules(self):
+        rules = self.load_config().get('rules', {})
+        self.mailmap_input.setPlainText(rules.get('mailmap', ''))
+        self.messages_input.setPlainText(rules.get('messages', ''))
+        self.date_shift_input.setValue(rules.get('date_shift_hours', 0))
+        self.pipeline_input.setChecked(rules.get('use_pipeline', False))
+
+    def save_rules(self):
+        mailmap = self.mailmap_input.toPlainText()
+        messages = self.messages_input.toPlainText()
+        date_shift_hours = self.date_shift_input.value()
+        try:
+            rule_set = RuleSet.from_text(mailmap, messages, date_shift_hours)
+        except ValueError as e:
+            QMessageBox.warning(self, "规则错误", str(e))
+            return
+        if rule_set.is_empty():
+            QMessageBox.warning(self, "提示", "请至少填写一条规则")
+            return
+        data = self.load_config()
+        data['rules'] = {'mailmap': mailmap, 'messages': messages, 'date_shift_hours': date_shift_hours,
+                         'use_pipeline': self.pipeline_input.isChecked()}
+        with open(self.config_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        self.rule_set = rule_set
+        self.accept()
+
+    def get_rule_set(self):
+        return self.rule_set
+
+    def use_pipeline(self):
+        return self.pipeline_input.isChecked()
@@ -0,0 +1,5 @@
+from .client import DaemonClient, DaemonError
+from .daemon import GitEditService, create_server, serve
+from .repo_state import RepoState
+
+__all__ = ['DaemonClient', 'DaemonError', 'GitEditService', 'RepoState', 'create_server', 'serve']
\ No newline at end of file
@@ -0,0 +1,44 @@
+import argparse
+import json
+import logging
+import sys
+
+from .client import DaemonClient, DaemonError
+from .daemon import serve
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m service", description="Git Commit Editor 守护进程")
+    parser.add_argument("--address", help="Unix socket 路径，或 host:port")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("serve", help="启动守护进程")
+    call = sub.add_parser("call", help="调用守护进程方法")
+    call.add_argument("method")
+    call.add_argument("params", nargs="?", default="{}", help='JSON 参数，如 {"repo": "."}')
+    args = parser.parse_args(argv)
+
+    address = args.address
+    if address and ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        address = (host, int(port))
+
+    if args.command == "serve":
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        serve(address)
+        return 0
+
+    try:
+        with DaemonClient(address) as client:
+            result = client.call(args.method, **json.loads(args.params))
+    except DaemonError as e:
+        print(f"错误({e.code}): {e}", file=sys.stderr)
+        return 1
+    except OSError as e:
+        print(f"无法连接守护进程，请先执行 python -m service serve: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
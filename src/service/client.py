@@ -0,0 +1,52 @@
+import itertools
+import json
+import socket
+
+from .daemon import DEFAULT_TOKEN_PATH, default_address, read_token
+
+
+class DaemonError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class DaemonClient:
+    """
+    守护进程的轻量客户端，一个连接上可以连续发送多次请求
+    """
+
+    def __init__(self, address=None, timeout=None, token=None):
+        address = address or default_address()
+        self.token = token or read_token(DEFAULT_TOKEN_PATH)
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = tuple(address)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.reader = self.sock.makefile("rb")
+        self.ids = itertools.count(1)
+
+    def call(self, method, **params):
+        request = {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params,
+                   "auth": self.token}
+        self.sock.sendall(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        line = self.reader.readline()
+        if not line:
+            raise DaemonError(-32000, "守护进程已断开连接")
+        response = json.loads(line)
+        if "error" in response:
+            raise DaemonError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,315 @@
+import hmac
+import inspect
+import json
+import logging
+import os
+import re
+import secrets
+import socket
+import socketserver
+import threading
+from datetime import datetime
+
+from callback import CallbackScriptBuilder
+from . import repo_ops, rewrite_plan
+from .repo_state import RepoState
+
+DAEMON_DIR = os.path.join(os.path.expanduser("~"), ".git_commit_edit")
+DEFAULT_SOCKET_PATH = os.path.join(DAEMON_DIR, "daemon.sock")
+# 每次启动生成的随机口令，只有当前用户可读；客户端在每条请求的 auth 字段中带上
+DEFAULT_TOKEN_PATH = os.path.join(DAEMON_DIR, "daemon.token")
+# 不支持 Unix socket 的平台（Windows）退回本机 TCP
+DEFAULT_TCP_ADDRESS = ("127.0.0.1", 47651)
+
+
+def default_address():
+    return DEFAULT_SOCKET_PATH if hasattr(socket, "AF_UNIX") else DEFAULT_TCP_ADDRESS
+
+
+def create_token(path=DEFAULT_TOKEN_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    token = secrets.token_hex(32)
+    repo_ops.delete_file(path)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def read_token(path=DEFAULT_TOKEN_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class GitEditService:
+    """
+    GitCommitEditor 中各项操作的无界面版本，按仓库路径保留常驻状态
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+        self.filter_repo = repo_ops.find_filter_repo()
+
+    def state(self, repo):
+        if not repo_ops.is_git_repo(repo):
+            raise RpcError(-32001, f"不是Git仓库: {repo}")
+        key = os.path.abspath(repo)
+        with self.lock:
+            if key not in self.states:
+                self.states[key] = RepoState(key)
+            return self.states[key]
+
+    def require_filter_repo(self):
+        if self.filter_repo is None:
+            self.filter_repo = repo_ops.find_filter_repo()
+        if self.filter_repo is None:
+            raise RpcError(-32002, "请先安装 git-filter-repo 工具")
+
+    @staticmethod
+    def arg(value, what):
+        try:
+            return repo_ops.check_arg(value, what)
+        except ValueError as e:
+            raise RpcError(-32602, str(e))
+
+    def branch(self, state, branch):
+        """
+        校验分支/版本参数并确认它存在，返回原名称
+        """
+        if not state.tip(self.arg(branch, "分支")):
+            raise RpcError(-32004, f"分支不存在: {branch}")
+        return branch
+
+    def rewrite(self, state, callback_path, extra_args=()):
+        with state.lock:
+            result = repo_ops.run_filter_repo(state.repo, callback_path, extra_args)
+            state.invalidate()
+        if result.returncode != 0:
+            raise RpcError(-32003, result.stderr)
+        return True
+
+    # ---------------------- RPC 方法 ----------------------
+    def list_branches(self, repo):
+        branches, current = self.state(repo).branches()
+        return {"branches": branches, "current": current}
+
+    def branch_overview(self, repo):
+        from branches.branch_overview import branch_overview
+
+        base, branches = branch_overview(self.state(repo).repo)
+        return {"default_branch": base, "branches": branches}
+
+    def load_commits(self, repo, branch):
+        state = self.state(repo)
+        return state.commits(self.branch(state, branch))
+
+    def commit_info(self, repo, commit):
+        info = self.state(repo).commit_info(self.arg(commit, "提交"))
+        if info is None:
+            raise RpcError(-32004, f"提交不存在: {commit}")
+        author, date, message = info
+        return {"author": author, "date": date, "message": message}
+
+    def checkout(self, repo, branch):
+        state = self.state(repo)
+        result = repo_ops.checkout(state.repo, self.arg(branch, "分支"))
+        state.invalidate()
+        if result.returncode != 0:
+            raise RpcError(-32003, result.stderr)
+        return True
+
+    def edit_commit(self, repo, commit, author, message, date):
+        self.require_filter_repo()
+        if not isinstance(commit, str) or not re.fullmatch(r"[0-9a-f]{7,40}", commit):
+            raise RpcError(-32602, f"无效的提交: {commit!r}")
+        state = self.state(repo)
+        name, email = repo_ops.split_author(author)
+        # 生成脚本到改写完成都持有仓库锁，避免并发请求覆盖同名的 callback 脚本
+        with state.lock:
+            callback_path = state.callback_path("edit_commit_callback.py")
+            if not CallbackScriptBuilder.build_single_commit_callback(
+                    callback_path, commit[:7], name, email, message, date):
+                raise RpcError(-32003, "生成 callback 脚本失败")
+            try:
+                return self.rewrite(state, callback_path)
+            finally:
+                repo_ops.delete_file(callback_path)
+
+    def bulk_rewrite(self, repo, branch, authors, start, end, base_commit="", incremental=False):
+        self.require_filter_repo()
+        if not authors:
+            raise RpcError(-32602, "请选择作者")
+        state = self.state(repo)
+        self.branch(state, branch)
+        with state.lock:
+            try:
+                commit_changes, extra_args, plan = rewrite_plan.prepare_random_rewrite(
+                    state.repo, branch, authors,
+                    datetime.fromisoformat(start), datetime.fromisoformat(end), base_commit, incremental)
+            except ValueError as e:
+                raise RpcError(-32005, str(e))
+            if not commit_changes:
+                return {"rewritten": 0}
+            callback_path = state.callback_path("rewrite_callback.py")
+            if not CallbackScriptBuilder.build_bulk_commit_callback(callback_path, commit_changes):
+                raise RpcError(-32003, "生成 callback 脚本失败")
+            try:
+                self.rewrite(state, callback_path, extra_args)
+            finally:
+                repo_ops.delete_file(callback_path)
+            rewrite_plan.finish_random_rewrite(state.repo, branch, plan)
+        return {"rewritten": len(commit_changes)}
+
+    def rewrite_rules(self, repo, rules):
+        self.require_filter_repo()
+        state = self.state(repo)
+        callback_path = state.rules_callback(rules)
+        if callback_path is None:
+            raise RpcError(-32003, "生成 callback 脚本失败")
+        return self.rewrite(state, callback_path)
+
+    def pipeline_rewrite(self, repo, commit_changes=None, rules=None, refs=None, workers=None):
+        """
+        不依赖 git-filter-repo，用 fast-export/fast-import 多进程流水线改写
+        """
+        from pipeline import FastExportPipeline, PipelineError
+
+        state = self.state(repo)
+        # 只允许这几个选项，其余必须是引用名，避免传入 --export-marks= 之类写文件的选项
+        for ref in refs or []:
+            if ref not in ("--all", "--branches", "--tags"):
+                self.arg(ref, "引用")
+        with state.lock:
+            try:
+                stats = FastExportPipeline(state.repo, commit_changes, rules, refs, workers).run()
+            except PipelineError as e:
+                raise RpcError(-32003, str(e))
+            finally:
+                state.invalidate()
+        return {"commits": stats.commits, "summary": stats.summary()}
+
+    def remote_rewrite(self, url, commit_changes=None, rules=None, workers=None, push=True):
+        """
+        部分克隆远程仓库（不下载文件内容），只改写提交后强推回去
+        """
+        from pipeline import RemoteRewrite, PipelineError
+
+        job = RemoteRewrite(self.arg(url, "远程仓库地址"), commit_changes, rules, workers)
+        try:
+            stats = job.run(push)
+        except PipelineError as e:
+            raise RpcError(-32003, str(e))
+        return {"commits": stats.commits, "updated_refs": job.updated_refs, "summary": stats.summary()}
+
+    def push(self, repo, remote, branch):
+        result = repo_ops.push_force(self.state(repo).repo, self.arg(remote, "远程仓库"), self.arg(branch, "分支"))
+        if result.returncode != 0:
+            raise RpcError(-32003, result.stderr)
+        return True
+
+    def forget(self, repo):
+        with self.lock:
+            state = self.states.pop(os.path.abspath(repo), None)
+        if state is not None:
+            state.close()
+        return True
+
+    def close(self):
+        with self.lock:
+            states, self.states = list(self.states.values()), {}
+        for state in states:
+            state.close()
+
+    METHODS = ("list_branches", "branch_overview", "load_commits", "commit_info", "checkout", "edit_commit",
+               "bulk_rewrite", "rewrite_rules", "pipeline_rewrite", "remote_rewrite", "push", "forget")
+
+    def dispatch(self, request):
+        """
+        处理一条 JSON-RPC 2.0 请求，返回响应字典
+        """
+        request_id = request.get("id")
+        try:
+            method = request.get("method")
+            if method not in self.METHODS:
+                raise RpcError(-32601, f"未知方法: {method}")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise RpcError(-32602, "params 必须是对象")
+            handler = getattr(self, method)
+            # 只校验参数是否匹配签名，方法内部的 TypeError 按内部错误处理
+            try:
+                inspect.signature(handler).bind(**params)
+            except TypeError as e:
+                raise RpcError(-32602, str(e))
+            result = handler(**params)
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RpcError as e:
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": e.code, "message": e.message}}
+        except Exception as e:
+            logging.error(f"daemon request failed: {request}", exc_info=e)
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}}
+
+
+class RpcHandler(socketserver.StreamRequestHandler):
+    # 每行一条 JSON 请求，每行一条 JSON 响应；
+    # 出现无法解析或未授权的请求时立即断开，避免浏览器等把 HTTP 请求体当作请求送进来
+    def handle(self):
+        for line in self.rfile:
+            if line.strip() == b"":
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                self.reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": str(e)}})
+                return
+            if not isinstance(request, dict):
+                self.reply({"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "请求必须是对象"}})
+                return
+            auth = request.pop("auth", None)
+            if not isinstance(auth, str) or not hmac.compare_digest(auth, self.server.token):
+                self.reply({"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32010, "message": "未授权"}})
+                return
+            self.reply(self.server.service.dispatch(request))
+
+    def reply(self, response):
+        self.wfile.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+def create_server(address=None, service=None, token_path=DEFAULT_TOKEN_PATH):
+    address = address or default_address()
+    if isinstance(address, str):
+        os.makedirs(os.path.dirname(address), exist_ok=True)
+        if os.path.exists(address):
+            os.remove(address)
+        server = socketserver.ThreadingUnixStreamServer(address, RpcHandler)
+        os.chmod(address, 0o600)
+    else:
+        server = socketserver.ThreadingTCPServer(tuple(address), RpcHandler)
+    server.daemon_threads = True
+    # 监听成功后再生成口令，端口被占用时不会覆盖正在运行的守护进程的口令
+    server.token = create_token(token_path)
+    server.token_path = token_path
+    server.service = service or GitEditService()
+    return server
+
+
+def serve(address=None):
+    server = create_server(address)
+    logging.info(f"git commit edit daemon listening on {server.server_address}")
+    try:
+        server.serve_forever()
+    finally:
+        server.service.close()
+        server.server_close()
+        repo_ops.delete_file(server.token_path)
+        if isinstance(server.server_address, str):
+            repo_ops.delete_file(server.server_address)
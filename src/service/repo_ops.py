@@ -0,0 +1,203 @@
+import os
+import random
+import shutil
+import subprocess
+from datetime import datetime, timedelta
+
+
+# ---------------------- 不依赖界面的 Git 操作 ----------------------
+def git_startupinfo():
+    # Windows下隐藏黑窗口，其他平台没有 STARTUPINFO
+    if not hasattr(subprocess, "STARTUPINFO"):
+        return None
+    startupinfo = subprocess.STARTUPINFO()
+    startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+    return startupinfo
+
+
+def run_git(args, repo, env=None, input=None):
+    return subprocess.run(
+        ["git"] + list(args),
+        cwd=repo,
+        input=input,
+        capture_output=True,
+        text=True,
+        env=env,
+        encoding='utf-8',
+        errors='replace',
+        startupinfo=git_startupinfo()
+    )
+
+
+def git_output(args, repo):
+    return run_git(args, repo).stdout.strip()
+
+
+def check_arg(value, what):
+    """
+    拒绝以 - 开头或包含换行的参数，避免被 git 当作选项（如 --output=、--receive-pack=）
+    """
+    if not isinstance(value, str) or value == "" or value.startswith("-") or any(c in value for c in "\r\n\0"):
+        raise ValueError(f"无效的{what}: {value!r}")
+    return value
+
+
+def resolve_rev(repo, rev):
+    """
+    返回 rev 对应的完整hash，不存在时返回空字符串
+    """
+    return git_output(["rev-parse", "--verify", "--quiet", "--end-of-options", check_arg(rev, "版本")], repo)
+
+
+def list_branches(repo):
+    """
+    返回 (分支列表, 当前分支)，远程分支去掉 remotes/origin/ 前缀后与本地分支合并
+    """
+    output = git_output(["branch", "-a"], repo)
+    current = ""
+    branches = set()
+    for branch in [line.strip() for line in output.split("\n") if line.strip() != '']:
+        if "HEAD" in branch:
+            continue
+        if branch.startswith("remotes/origin/"):
+            branches.add(branch.replace("remotes/origin/", ""))
+            continue
+        if branch.startswith("*"):
+            current = branch.split("*")[-1].strip()
+            branches.add(current)
+        else:
+            branches.add(branch)
+    return sorted(branches), current
+
+
+def checkout(repo, branch):
+    # checkout 不支持 --end-of-options，分支名后面的 -- 保证它不会被当作路径
+    return run_git(["checkout", check_arg(branch, "分支"), "--"], repo)
+
+
+LOG_FORMAT = "%h %an <%ae> %ad %s %d"
+
+
+def commit_log(repo, branch):
+    return git_output(["log", f"--pretty=format:{LOG_FORMAT}", "--date=iso", "--end-of-options", branch],
+                      repo).splitlines()
+
+
+def commit_lines(repo, commits):
+    """
+    按提交列表中的显示格式渲染指定提交，返回 {完整hash: 行}
+    """
+    if not commits:
+        return {}
+    output = run_git(["log", "--no-walk=unsorted", "--stdin", f"--pretty=format:%H%x00{LOG_FORMAT}", "--date=iso"],
+                     repo, input="\n".join(commits) + "\n").stdout
+    lines = {}
+    for line in output.splitlines():
+        full, _, text = line.partition("\x00")
+        lines[full] = text
+    return lines
+
+
+def commit_infos(repo, commits):
+    """
+    一次 git log 读取多个提交的 作者/时间/标题，返回 {完整hash: (author, date, message)}
+    """
+    if not commits:
+        return {}
+    # 提交可能有上万个，通过 --stdin 传入，避免超出命令行长度限制（Windows 约 32K 字符）
+    output = run_git(["log", "--no-walk=unsorted", "--stdin", "--pretty=format:%H%x00%an <%ae>%x00%ad%x00%s",
+                      "--date=iso"], repo, input="\n".join(commits) + "\n").stdout
+    infos = {}
+    for line in output.splitlines():
+        parts = line.split("\x00")
+        if len(parts) == 4:
+            infos[parts[0]] = (parts[1], parts[2], parts[3])
+    return infos
+
+
+def split_author(author):
+    name = author.split("<")[0].strip()
+    email = author.split("<")[1].strip(" >")
+    return name, email
+
+
+def plan_random_rewrite(repo, branch, authors, start, end, base_commit="", rng=random, since=None, seed=None,
+                        not_before=None):
+    """
+    为分支上的提交随机分配作者和时间，返回 CallbackScriptBuilder 使用的 commit_changes
+    base_commit 不为空时只处理该提交之后（含该提交）的记录
+    since 不为空时只处理 since..branch 范围内的提交
+    seed 不为空时结果可重现：同一个提交总是分到同一个作者
+    not_before 不为空时分配的时间都不早于它，保证接在已改写的父提交之后
+    """
+    commits = git_output(["rev-list", "--end-of-options", f"{since}..{branch}" if since else branch],
+                         repo).splitlines()
+
+    short_commits = [commit[:7] for commit in commits]
+    if base_commit != "" and base_commit in short_commits:
+        index = short_commits.index(base_commit)
+        index = index + 1 if index < (len(commits) - 1) else -1
+        commits = commits[:index]
+    if not commits:
+        return {}
+
+    if seed is not None:
+        rng = random.Random(f"{seed}:{since}:{commits[0]}")
+    if not_before is not None:
+        start = max(start, not_before)
+        end = max(end, start)
+    seconds_range = int((end - start).total_seconds())
+    time_steps = sorted([rng.randint(0, seconds_range) for _ in range(len(commits))], reverse=True)
+    infos = commit_infos(repo, commits)
+    commit_changes = {}
+    for i, commit in enumerate(commits):
+        _, date, message = infos[commit]
+        # 保留原提交的时分秒，只随机日期
+        commit_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S %z")
+        rand_time = start + timedelta(seconds=time_steps[i])
+        commit_date = datetime(year=rand_time.year, month=rand_time.month, day=rand_time.day,
+                               hour=commit_date.hour, minute=commit_date.minute, second=commit_date.second)
+        if not_before is not None:
+            commit_date = max(commit_date, not_before)
+        author_rng = random.Random(f"{seed}:{commit}") if seed is not None else rng
+        name, email = split_author(author_rng.choice(authors))
+        commit_changes[commit[:7]] = {
+            "name": name,
+            "email": email,
+            "date": commit_date.strftime("%Y-%m-%dT%H:%M:%S"),
+            "message": message,
+        }
+    return commit_changes
+
+
+def find_filter_repo():
+    return shutil.which("git-filter-repo")
+
+
+def run_filter_repo(repo, callback_path, extra_args=()):
+    return subprocess.run(
+        [find_filter_repo() or "git-filter-repo", "--commit-callback", callback_path, "--force"] + list(extra_args),
+        cwd=repo,
+        capture_output=True,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+        startupinfo=git_startupinfo()
+    )
+
+
+def push_force(repo, remote, branch):
+    return run_git(["push", "--set-upstream", "--force", "--end-of-options",
+                    check_arg(remote, "远程仓库"), check_arg(branch, "分支")], repo)
+
+
+def is_git_repo(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, ".git"))
+
+
+def delete_file(path):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import threading
+from datetime import datetime, timezone, timedelta
+
+from callback import CallbackScriptBuilder
+from . import repo_ops
+
+
+class CatFileBatch:
+    """
+    常驻的 git cat-file --batch 进程，读取提交对象时不必每次启动 git
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            cwd=self.repo,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            startupinfo=repo_ops.git_startupinfo()
+        )
+
+    def read(self, rev):
+        # 每行一个请求，rev 中的换行会让之后所有应答错位
+        if "\n" in rev or "\r" in rev:
+            raise ValueError(f"无效的版本: {rev!r}")
+        self.process.stdin.write(rev.encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        line = self.process.stdout.readline()
+        if line.endswith((b" missing\n", b" ambiguous\n")):
+            return None, None
+        header = line.split()
+        if len(header) != 3 or not header[2].isdigit():
+            # 应答与请求对不上，重启进程重新同步
+            self.close()
+            self.start()
+            return None, None
+        content = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)
+        return header[1].decode(), content
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+
+def format_git_date(timestamp, tz):
+    sign = -1 if tz.startswith("-") else 1
+    offset = timedelta(hours=int(tz[1:3]), minutes=int(tz[3:5])) * sign
+    dt = datetime.fromtimestamp(int(timestamp), timezone(offset))
+    return dt.strftime("%Y-%m-%d %H:%M:%S ") + tz
+
+
+def parse_commit_object(content):
+    """
+    解析提交对象，返回与 git show --pretty=format:%an <%ae>%n%ad%n%s 相同的 (author, date, message)
+    """
+    text = content.decode("utf-8", errors="replace")
+    headers, _, message = text.partition("\n\n")
+    author, date = "", ""
+    for line in headers.splitlines():
+        if line.startswith("author "):
+            ident, timestamp, tz = line[len("author "):].rsplit(" ", 2)
+            author, date = ident, format_git_date(timestamp, tz)
+    subject = " ".join(message.split("\n\n")[0].split())
+    return author, date, subject
+
+
+class RepoState:
+    """
+    单个仓库的常驻状态：分支列表、按分支 tip 缓存的提交记录、cat-file 进程、生成好的规则 callback
+    任何改写操作之后调用 invalidate()
+    """
+
+    def __init__(self, repo):
+        self.repo = os.path.abspath(repo)
+        self.lock = threading.RLock()
+        self._branches = None
+        self._logs = {}
+        self._rule_callbacks = {}
+        self._cat_file = None
+        self._work_dir = tempfile.mkdtemp(prefix="git_commit_edit_")
+
+    def tip(self, branch):
+        return repo_ops.resolve_rev(self.repo, branch)
+
+    def branches(self):
+        with self.lock:
+            if self._branches is None:
+                self._branches = repo_ops.list_branches(self.repo)
+            return self._branches
+
+    def commits(self, branch):
+        with self.lock:
+            tip = self.tip(branch)
+            cached = self._logs.get(branch)
+            if cached is None or cached[0] != tip:
+                cached = (tip, repo_ops.commit_log(self.repo, tip) if tip else [])
+                self._logs[branch] = cached
+            return cached[1]
+
+    def commit_info(self, commit):
+        with self.lock:
+            if self._cat_file is None:
+                self._cat_file = CatFileBatch(self.repo)
+            object_type, content = self._cat_file.read(commit)
+            if object_type != "commit":
+                return None
+            return parse_commit_object(content)
+
+    def rules_callback(self, rules_spec):
+        """
+        相同规则只生成一次 callback 脚本
+        """
+        with self.lock:
+            key = hashlib.sha1(json.dumps(rules_spec, sort_keys=True).encode("utf-8")).hexdigest()
+            path = self._rule_callbacks.get(key)
+            if path is None or not os.path.exists(path):
+                path = os.path.join(self._work_dir, f"rules_{key[:12]}.py")
+                if not CallbackScriptBuilder.build_rules_callback(path, rules_spec):
+                    return None
+                self._rule_callbacks[key] = path
+            return path
+
+    def callback_path(self, name):
+        return os.path.join(self._work_dir, name)
+
+    def invalidate(self):
+        with self.lock:
+            self._branches = None
+            self._logs.clear()
+            # 改写后对象库变化，重新启动 cat-file
+            if self._cat_file is not None:
+                self._cat_file.close()
+                self._cat_file = None
+
+    def close(self):
+        self.invalidate()
+        for path in self._rule_callbacks.values():
+            repo_ops.delete_file(path)
+        try:
+            os.rmdir(self._work_dir)
+        except OSError:
+            pass
@@ -0,0 +1,120 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from . import repo_ops
+
+PLAN_FILE = os.path.join("git_commit_edit", "plans.json")
+
+
+# ---------------------- 已保存的改写方案 ----------------------
+def git_dir(repo):
+    return repo_ops.git_output(["rev-parse", "--absolute-git-dir"], repo)
+
+
+def load_plans(repo):
+    path = os.path.join(git_dir(repo), PLAN_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_plan(repo, branch):
+    """
+    返回分支上次应用的方案：authors/start/end/seed 以及改写后的 tip（高水位）
+    """
+    return load_plans(repo).get(branch)
+
+
+def save_plan(repo, branch, plan):
+    path = os.path.join(git_dir(repo), PLAN_FILE)
+    plans = load_plans(repo)
+    plans[branch] = plan
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(plans, f, indent=2, ensure_ascii=False)
+
+
+def load_commit_map(repo):
+    """
+    读取 git-filter-repo（或 FastExportPipeline）写出的 commit-map，返回 {旧hash: 新hash}
+    """
+    path = os.path.join(git_dir(repo), "filter-repo", "commit-map")
+    commit_map = {}
+    if not os.path.exists(path):
+        return commit_map
+    with open(path, "r", encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            parts = line.split()
+            if len(parts) == 2:
+                commit_map[parts[0]] = parts[1]
+    return commit_map
+
+
+def is_ancestor(repo, commit, branch):
+    return repo_ops.run_git(["merge-base", "--is-ancestor", "--end-of-options", commit, branch], repo).returncode == 0
+
+
+def high_water_mark(repo, branch, plan):
+    """
+    上次改写后的 tip；如果之后又被其他改写替换过，通过 commit-map 找到对应的新提交
+    """
+    tip = plan.get("tip") if plan else None
+    if not tip:
+        return None
+    if is_ancestor(repo, tip, branch):
+        return tip
+    remapped = load_commit_map(repo).get(tip)
+    if remapped and is_ancestor(repo, remapped, branch):
+        return remapped
+    return None
+
+
+def commit_time(repo, commit):
+    """
+    提交时间换算到 callback 使用的 +0800 时区，返回不带时区的 datetime
+    """
+    date = repo_ops.git_output(["log", "-1", "--format=%ad", "--date=iso", commit], repo)
+    commit_date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S %z")
+    return commit_date.astimezone(timezone(timedelta(hours=8))).replace(tzinfo=None)
+
+
+def prepare_random_rewrite(repo, branch, authors, start, end, base_commit="", incremental=False):
+    """
+    生成随机改写的 commit_changes，返回 (commit_changes, filter-repo 额外参数, 待保存的方案)
+    incremental 为 True 时只处理上次高水位之后的新提交，作者按 seed 和提交hash确定，
+    时间在本次传入的范围内分配，并且不早于高水位提交的时间
+    """
+    plan = load_plan(repo, branch)
+    seed = plan["seed"] if plan else random.randrange(2 ** 32)
+    since = None
+    not_before = None
+    if incremental:
+        since = high_water_mark(repo, branch, plan)
+        if since is None:
+            raise ValueError("找不到上次改写的位置，请先执行一次完整改写")
+        not_before = commit_time(repo, since)
+    commit_changes = repo_ops.plan_random_rewrite(repo, branch, authors, start, end,
+                                                  "" if since else base_commit, since=since, seed=seed,
+                                                  not_before=not_before)
+    extra_args = ["--refs", f"{since}..{branch}"] if since else []
+    new_plan = {
+        "authors": authors,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "seed": seed,
+    }
+    return commit_changes, extra_args, new_plan
+
+
+def finish_random_rewrite(repo, branch, plan):
+    """
+    改写成功后记录新的 tip 作为下次增量改写的起点
+    """
+    plan = dict(plan)
+    plan["tip"] = repo_ops.resolve_rev(repo, branch)
+    plan["updated"] = datetime.now().isoformat(timespec="seconds")
+    save_plan(repo, branch, plan)
@@ -0,0 +1,4 @@
+# RefWatcher 依赖 PyQt5，不在这里导入，增量计算本身不需要界面
+from .ref_delta import RefDelta, compute_delta
+
+__all__ = ['RefDelta', 'compute_delta']
@@ -0,0 +1,66 @@
+from service import repo_ops, rewrite_plan
+
+ZERO_ID = "0" * 40
+
+
+class RefDelta:
+    """
+    提交列表需要做的增量修改：
+    prepend 为新增的行（新→旧），replace 为 {显示的短hash: 新行}，remove 为要删除的短hash
+    reload 为 True 表示无法增量计算，需要重新加载整个列表
+    """
+
+    def __init__(self, tip, prepend=None, replace=None, remove=None, reload=False):
+        self.tip = tip
+        self.prepend = prepend or []
+        self.replace = replace or {}
+        self.remove = remove or set()
+        self.reload = reload
+
+
+def expand_short_hashes(shown, full_ids):
+    """
+    把列表中显示的短hash对应到完整hash，返回 {完整hash: 短hash}
+    """
+    lengths = {len(short) for short in shown}
+    index = {}
+    for full in full_ids:
+        for length in lengths:
+            index[full[:length]] = full
+    return {index[short]: short for short in shown if short in index}
+
+
+def compute_delta(repo, branch, old_tip, shown):
+    """
+    根据分支 tip 的变化计算提交列表的增量，shown 为列表中当前显示的短hash
+    分支没有变化时返回 None
+    """
+    new_tip = repo_ops.git_output(["rev-parse", "--verify", "--quiet", branch], repo)
+    if not new_tip or not old_tip:
+        return RefDelta(new_tip, reload=True)
+    if new_tip == old_tip:
+        return None
+
+    # 快进：只把新提交加到列表前面，并刷新原 tip 的分支标记
+    if rewrite_plan.is_ancestor(repo, old_tip, new_tip):
+        new_commits = repo_ops.git_output(["rev-list", f"{old_tip}..{new_tip}"], repo).splitlines()
+        lines = repo_ops.commit_lines(repo, new_commits + [old_tip])
+        replace = {}
+        old_short = expand_short_hashes(shown, [old_tip]).get(old_tip)
+        if old_short is not None:
+            replace[old_short] = lines[old_tip]
+        return RefDelta(new_tip, prepend=[lines[c] for c in new_commits if c in lines], replace=replace)
+
+    # 历史被改写：通过 commit-map 只替换发生变化的提交
+    commit_map = rewrite_plan.load_commit_map(repo)
+    mapped_tip = commit_map.get(old_tip)
+    if mapped_tip is None or mapped_tip == ZERO_ID or not rewrite_plan.is_ancestor(repo, mapped_tip, new_tip):
+        return RefDelta(new_tip, reload=True)
+    changed = {old: new for old, new in commit_map.items() if old != new}
+    shown_full = expand_short_hashes(shown, changed.keys())
+    remove = {short for full, short in shown_full.items() if changed[full] == ZERO_ID}
+    targets = {full: changed[full] for full in shown_full if changed[full] != ZERO_ID}
+    new_commits = repo_ops.git_output(["rev-list", f"{mapped_tip}..{new_tip}"], repo).splitlines()
+    lines = repo_ops.commit_lines(repo, new_commits + list(targets.values()))
+    replace = {shown_full[old]: lines[new] for old, new in targets.items() if new in lines}
+    return RefDelta(new_tip, prepend=[lines[c] for c in new_commits if c in lines], replace=replace, remove=remove)
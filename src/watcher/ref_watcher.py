@@ -0,0 +1,102 @@
+import os
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from service.repo_ops import git_output
+
+
+class RefWatcher(QObject):
+    """
+    监听 HEAD、packed-refs 和 refs/heads，引用变化时发出 refs_changed
+    文件监听不可用（如网络磁盘）时靠轮询文件状态兜底；
+    工作树和子模块的 .git 是文件，HEAD 在各自的 git 目录，分支引用在公共 git 目录
+    """
+    refs_changed = pyqtSignal()
+
+    POLL_INTERVAL = 10000
+    FALLBACK_POLL_INTERVAL = 2000
+    DEBOUNCE_INTERVAL = 300
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.git_dir = None
+        self.common_dir = None
+        self.fingerprint = None
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_path_changed)
+        self.watcher.directoryChanged.connect(self.on_path_changed)
+
+        # git 提交时连续写多个文件，合并成一次通知
+        self.debounce = QTimer(self)
+        self.debounce.setSingleShot(True)
+        self.debounce.setInterval(self.DEBOUNCE_INTERVAL)
+        self.debounce.timeout.connect(self.check)
+
+        self.poll = QTimer(self)
+        self.poll.timeout.connect(self.check)
+
+    def watch(self, repo):
+        self.stop()
+        git_dir = git_output(["rev-parse", "--absolute-git-dir"], repo)
+        if not git_dir or not os.path.isdir(git_dir):
+            return
+        common_dir = git_output(["rev-parse", "--git-common-dir"], repo)
+        self.git_dir = git_dir
+        self.common_dir = os.path.normpath(os.path.join(repo, common_dir)) if common_dir else git_dir
+        self.fingerprint = self.read_fingerprint()
+        self.add_paths()
+        watching = bool(self.watcher.files() or self.watcher.directories())
+        self.poll.start(self.POLL_INTERVAL if watching else self.FALLBACK_POLL_INTERVAL)
+
+    def stop(self):
+        self.poll.stop()
+        self.debounce.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self.git_dir = None
+        self.common_dir = None
+
+    def ref_files(self):
+        files = [os.path.join(self.git_dir, "HEAD"), os.path.join(self.common_dir, "packed-refs")]
+        for root, _, names in os.walk(os.path.join(self.common_dir, "refs", "heads")):
+            files.extend(os.path.join(root, name) for name in names)
+        return [path for path in files if os.path.isfile(path)]
+
+    def watched_paths(self):
+        # 目录也要监听，git 用重命名替换文件、新建分支时只有目录会收到通知
+        directories = {self.git_dir, self.common_dir}
+        for root, _, _ in os.walk(os.path.join(self.common_dir, "refs", "heads")):
+            directories.add(root)
+        return sorted(directories) + self.ref_files()
+
+    def add_paths(self):
+        # git 通过重命名 *.lock 更新文件，原来的监听会失效，需要重新添加
+        current = set(self.watcher.files() + self.watcher.directories())
+        missing = [path for path in self.watched_paths() if path not in current]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def read_fingerprint(self):
+        fingerprint = []
+        # 只看引用文件本身，git 目录的 mtime 会随 index、锁文件等变化
+        for path in self.ref_files():
+            try:
+                stat = os.stat(path)
+                fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                pass
+        return fingerprint
+
+    def on_path_changed(self, path):
+        self.debounce.start()
+
+    def check(self):
+        if self.git_dir is None:
+            return
+        self.add_paths()
+        fingerprint = self.read_fingerprint()
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self.refs_changed.emit()